@@ -7,19 +7,27 @@ Date: 2025
 """
 
 import os
+import argparse
+import codecs
 import json
 import logging
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional, Dict
+from typing import Optional, Dict, Iterator, List
 
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
 import mysql.connector
 from mysql.connector import Error as MySQLError
+import matplotlib
+
+matplotlib.use("Agg")                               # batch pipeline, no GUI needed
 import seaborn as sns
 import matplotlib.pyplot as plt
-from sklearn.preprocessing import LabelEncoder
 
 # ----------------------------------------------------------------------
 # Global settings
@@ -38,6 +46,37 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Rows pulled per round-trip from the server-side cursor
+FETCH_SIZE = 100_000
+
+# Text columns held as Arrow-backed strings so the .str kernels run in C++
+STRING_COLUMNS = ("name", "phone", "email", "notes", "category")
+
+FREE_EMAIL_DOMAINS = pa.array(
+    [
+        "gmail.com",
+        "yahoo.com",
+        "hotmail.com",
+        "outlook.com",
+        "icloud.com",
+        "proton.me",
+    ]
+)
+
+
+def _iter_batches(cursor) -> Iterator[List[tuple]]:
+    """Yield FETCH_SIZE-row batches until the cursor is exhausted."""
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            return
+        yield rows
+
+
+def _flag(s: pd.Series) -> pd.Series:
+    """0/1 indicator column stored as int8."""
+    return s.astype("int8")
+
 
 class ContactDataAnalyzer:
     def __init__(self, output_dir: str = "contact_analysis_output"):
@@ -55,7 +94,6 @@ class ContactDataAnalyzer:
 
         self.df: Optional[pd.DataFrame] = None
         self.category_mapping: Dict[str, int] = {}
-        self.le_category = LabelEncoder()
 
     # ------------------------------------------------------------------
     # 1. Data extraction
@@ -71,7 +109,24 @@ class ContactDataAnalyzer:
                 FROM contacts
                 ORDER BY created_at DESC
             """
-            self.df = pd.read_sql(query, conn)
+            cursor = conn.cursor(buffered=False)
+            try:
+                cursor.execute(query)
+                columns = [col[0] for col in cursor.description]
+                chunks = [
+                    pd.DataFrame.from_records(rows, columns=columns)
+                    for rows in _iter_batches(cursor)
+                ]
+                self.df = (
+                    pd.concat(chunks, ignore_index=True)
+                    if chunks
+                    else pd.DataFrame(columns=columns)
+                )
+            finally:
+                cursor.close()
+
+            for col in STRING_COLUMNS:
+                self.df[col] = self.df[col].astype("string[pyarrow]")
             logger.info(f"Successfully extracted {len(self.df):,} contacts.")
             return True
         except MySQLError as e:
@@ -91,107 +146,148 @@ class ContactDataAnalyzer:
         if self.df is None or self.df.empty:
             raise ValueError("No data available for feature engineering.")
 
-        df = self.df.copy()
+        df = self.df
         logger.info("Starting advanced feature engineering...")
 
+        # Derived columns are collected here and attached in a single concat
+        # at the end rather than inserted into the frame one at a time
+        features: Dict[str, object] = {}
+
         # ---- Name -------------------------------------------------------
-        df["name"] = df["name"].astype(str).str.strip()
-        df["name_length"] = df["name"].str.len()
-        df["name_words"] = df["name"].str.split().str.len()
-        df["has_title"] = (
-            df["name"]
-            .str.contains(r"\b(Dr|Mr|Mrs|Ms|Prof|Eng|Sir|Lady)\.?", case=False, na=False)
-            .astype(int)
+        df["name"] = df["name"].str.strip()
+        features["name_length"] = df["name"].str.len().fillna(0).astype("int16")
+        features["name_words"] = df["name"].str.split().str.len().fillna(0).astype("int16")
+        features["has_title"] = _flag(
+            df["name"].str.contains(
+                r"\b(?:Dr|Mr|Mrs|Ms|Prof|Eng|Sir|Lady)\.?", case=False, na=False
+            )
         )
-        df["is_company"] = (
-            df["name"]
-            .str.contains(r"\b(Inc|Ltd|Corp|LLC|GmbH|Co\.|Company)\b", case=True, na=False)
-            .astype(int)
+        features["is_company"] = _flag(
+            df["name"].str.contains(
+                r"\b(?:Inc|Ltd|Corp|LLC|GmbH|Co\.|Company)\b", case=True, na=False
+            )
         )
 
         # ---- Phone ------------------------------------------------------
-        df["phone_clean"] = df["phone"].astype(str).str.replace(r"\D", "", regex=True)
-        df["phone_digit_count"] = df["phone_clean"].str.len()
-        df["is_international"] = (df["phone_digit_count"] > 10).astype(int)
-        df["area_code"] = df["phone_clean"].str[:3].where(df["phone_digit_count"] >= 10)
-        df["has_extension"] = (
-            df["phone"].astype(str).str.contains(r"x|ext|#", case=False, na=False).astype(int)
-        )
+        phone_clean = df["phone"].str.replace(r"\D", "", regex=True)
+        digit_count = phone_clean.str.len().fillna(0).astype("int16")
+        features["phone_clean"] = phone_clean
+        features["phone_digit_count"] = digit_count
+        features["is_international"] = _flag(digit_count > 10)
+        features["area_code"] = phone_clean.str[:3].where(digit_count >= 10)
+        # "ext" always contains "x", so x|ext|# reduces to a single character class
+        features["has_extension"] = _flag(df["phone"].str.contains(r"[xX#]", na=False))
 
         # ---- Email ------------------------------------------------------
-        df["has_email"] = df["email"].notna().astype(int)
-        df["email_domain"] = (
-            df["email"]
-            .astype(str)
-            .str.split("@")
-            .str[-1]
-            .str.lower()
-            .where(df["has_email"] == 1)
-        )
-        free_domains = {
-            "gmail.com",
-            "yahoo.com",
-            "hotmail.com",
-            "outlook.com",
-            "icloud.com",
-            "proton.me",
-        }
-        df["email_is_free"] = df["email_domain"].isin(free_domains).astype(int)
+        features["has_email"] = has_email = _flag(df["email"].notna())
+        # Strip through the last "@"; strings without one are kept whole, like split()[-1]
+        email_domain = df["email"].str.replace(r"(?s)^.*@", "", regex=True).str.lower()
+        is_free = pc.is_in(pa.array(email_domain), value_set=FREE_EMAIL_DOMAINS)
+        features["email_domain"] = email_domain
+        features["email_is_free"] = email_is_free = np.asarray(is_free).astype(np.int8)
 
         # ---- Notes ------------------------------------------------------
-        df["has_notes"] = df["notes"].notna().astype(int)
-        df["notes_length"] = df["notes"].fillna("").str.len()
-        df["notes_word_count"] = df["notes"].fillna("").str.split().str.len()
-        df["notes_has_url"] = (
-            df["notes"]
-            .astype(str)
-            .str.contains(r"https?://", case=False, na=False)
-            .astype(int)
+        features["has_notes"] = has_notes = _flag(df["notes"].notna())
+        notes_length = df["notes"].str.len().fillna(0).astype("int32")
+        features["notes_length"] = notes_length
+        features["notes_word_count"] = (
+            df["notes"].str.split().str.len().fillna(0).astype("int16")
         )
+        # No regex scan at all when nobody has notes
+        if has_notes.any():
+            features["notes_has_url"] = _flag(
+                df["notes"].str.contains(r"https?://", case=False, na=False)
+            )
+        else:
+            features["notes_has_url"] = np.zeros(len(df), dtype=np.int8)
 
         # ---- Time features -----------------------------------------------
         df["created_at"] = pd.to_datetime(df["created_at"], errors="coerce")
         df["updated_at"] = pd.to_datetime(df["updated_at"], errors="coerce")
 
-        df["created_year"] = df["created_at"].dt.year
-        df["created_month"] = df["created_at"].dt.month
-        df["created_dayofweek"] = df["created_at"].dt.dayofweek
-        df["created_hour"] = df["created_at"].dt.hour
-        df["is_weekend"] = df["created_dayofweek"].isin([5, 6]).astype(int)
-        df["days_since_creation"] = (datetime.now() - df["created_at"]).dt.days
-
-        df["was_recently_updated"] = (
-            (df["updated_at"] - df["created_at"]) > pd.Timedelta(days=1)
-        ).astype(int)
+        # One DatetimeIndex wrapper serves every calendar field below; the
+        # nullable Int dtypes keep NaT rows as NA instead of casting NaN to int
+        created_idx = pd.DatetimeIndex(df["created_at"])
+        dayofweek = pd.array(created_idx.dayofweek, dtype="Int8")
+        features["created_year"] = pd.array(created_idx.year, dtype="Int16")
+        features["created_month"] = pd.array(created_idx.month, dtype="Int8")
+        features["created_dayofweek"] = dayofweek
+        features["created_hour"] = pd.array(created_idx.hour, dtype="Int8")
+        features["is_weekend"] = (dayofweek >= 5).to_numpy(dtype=np.int8, na_value=0)
+
+        now64 = np.datetime64(datetime.now(), "ns")
+        created = df["created_at"].to_numpy(dtype="datetime64[ns]")
+        updated = df["updated_at"].to_numpy(dtype="datetime64[ns]")
+        # Missing creation dates stay NA instead of being cast to a bogus day count
+        missing_created = np.isnat(created)
+        days = (now64 - np.where(missing_created, now64, created)) // np.timedelta64(1, "D")
+        features["days_since_creation"] = pd.arrays.IntegerArray(
+            days.astype(np.int32), missing_created
+        )
+        features["was_recently_updated"] = (
+            (updated - created) > np.timedelta64(1, "D")
+        ).astype(np.int8)
 
         # ---- Target -----------------------------------------------------
         df["category"] = df["category"].fillna("Other").str.strip()
-        df["category_encoded"] = self.le_category.fit_transform(df["category"])
-        self.category_mapping = dict(
-            zip(self.le_category.classes_, self.le.classes_indices_)
-        )
+        cat = pd.Categorical(df["category"])
+        features["category_encoded"] = cat.codes.astype(np.int32)
+        self.category_mapping = {c: i for i, c in enumerate(cat.categories)}
 
         # ---- Composite quality score ------------------------------------
-        df["contact_quality_score"] = (
-            df["has_email"] * 3
-            + df["has_notes"] * 2
-            + (df["notes_length"] > 50).astype(int) * 2
-            + (~df["email_is_free"]).astype(int) * 1
-        )
-
-        self.df = df
+        long_notes = (notes_length.to_numpy() > 50).astype(np.int8)
+        features["contact_quality_score"] = (
+            has_email.to_numpy() * 3
+            + has_notes.to_numpy() * 2
+            + long_notes * 2
+            + (1 - email_is_free)
+        ).astype(np.int8)
+
+        self.df = pd.concat([df, pd.DataFrame(features, index=df.index)], axis=1)
         logger.info("Feature engineering completed.")
 
     # ------------------------------------------------------------------
     # 3. EDA report (fixed subplot layout & Persian font handling)
     # ------------------------------------------------------------------
-    def generate_eda_report(self) -> None:
+    def generate_eda_report(self, plots: bool = True) -> None:
         if self.df is None:
             return
 
         timestamp = datetime.now().strftime("%Y%m%d_%H%M")
         df = self.df
 
+        # Aggregates are computed once and shared by the figure and the HTML summary
+        cat_counts = df["category"].value_counts()
+        qs_counts = df["contact_quality_score"].value_counts().sort_index()
+        intl_free = pd.crosstab(df["is_international"], df["email_is_free"])
+
+        stats = {
+            "Total Contacts": f"{len(df):,}",
+            "Unique Categories": len(cat_counts),
+            "Contacts with Email": int(df["has_email"].sum()),
+            "Contacts with Notes": int(df["has_notes"].sum()),
+            "International Numbers": int(intl_free.sum(axis=1).get(1, 0)),
+            "High-Quality (Score ≥5)": int(qs_counts[qs_counts.index >= 5].sum()),
+            "Report Generated": datetime.now().strftime("%Y-%m-%d %H:%M"),
+        }
+
+        if not plots:
+            self._save_html_report(timestamp, stats, image=None)
+            return
+
+        monthly = df.groupby(df["created_at"].dt.to_period("M")).size()
+        corr_cols = [
+            "name_length",
+            "phone_digit_count",
+            "has_email",
+            "has_notes",
+            "notes_length",
+            "contact_quality_score",
+            "category_encoded",
+        ]
+        corr = df[corr_cols].corr()
+        hour_counts = df["created_hour"].value_counts().sort_index()
+
         # Try to use a Persian-friendly font if available
         try:
             plt.rcParams["font.family"] = "Tahoma"
@@ -209,20 +305,18 @@ class ContactDataAnalyzer:
 
         # 1. Category distribution
         ax1 = plt.subplot(2, 3, 1)
-        df["category"].value_counts().plot(kind="bar", ax=ax1, color="teal", alpha=0.8)
+        cat_counts.plot(kind="bar", ax=ax1, color="teal", alpha=0.8)
         ax1.set_title("Distribution by Category", fontweight="bold")
         ax1.tick_params(axis="x", rotation=45)
 
         # 2. Quality score
         ax2 = plt.subplot(2, 3, 2)
-        df["contact_quality_score"].value_counts().sort_index().plot(
-            kind="bar", ax=ax2, color="gold", edgecolor="black"
-        )
+        qs_counts.plot(kind="bar", ax=ax2, color="gold", edgecolor="black")
         ax2.set_title("Contact Quality Score", fontweight="bold")
 
         # 3. International vs Free email
         ax3 = plt.subplot(2, 3, 3)
-        pd.crosstab(df["is_international"], df["email_is_free"]).plot(
+        intl_free.plot(
             kind="bar", stacked=True, ax=ax3, color=["lightcoral", "skyblue"]
         )
         ax3.set_title("International × Free Email", fontweight="bold")
@@ -230,52 +324,32 @@ class ContactDataAnalyzer:
 
         # 4. Monthly growth
         ax4 = plt.subplot(2, 3, 4)
-        monthly = df.groupby(df["created_at"].dt.to_period("M")).size()
         monthly.plot(kind="line", marker="o", ax=ax4, linewidth=2.5, color="darkgreen")
         ax4.set_title("Monthly Contact Growth", fontweight="bold")
 
         # 5. Correlation matrix
         ax5 = plt.subplot(2, 3, 5)
-        corr_cols = [
-            "name_length",
-            "phone_digit_count",
-            "has_email",
-            "has_notes",
-            "notes_length",
-            "contact_quality_score",
-            "category_encoded",
-        ]
-        corr = df[corr_cols].corr()
         sns.heatmap(corr, annot=True, cmap="RdYlGn", center=0, ax=ax5, fmt=".2f")
         ax5.set_title("Feature Correlation", fontweight="bold")
 
         # 6. Hour of day
         ax6 = plt.subplot(2, 3, 6)
-        df["created_hour"].value_counts().sort_index().plot(
-            kind="bar", ax=ax6, color="orange", alpha=0.8
-        )
+        hour_counts.plot(kind="bar", ax=ax6, color="orange", alpha=0.8)
         ax6.set_title("Contacts Added by Hour", fontweight="bold")
 
         plt.tight_layout(rect=[0, 0.03, 1, 0.95])
-        report_path = self.output_dir / f"EDA_Report_{timestamp}.png"
-        plt.savefig(report_path, dpi=300, bbox_inches="tight", facecolor="white")
+        report_path = self.output_dir / f"EDA_Report_{timestamp}.webp"
+        plt.savefig(report_path, dpi=150, bbox_inches="tight", facecolor="white")
         plt.close()
         logger.info(f"EDA image saved → {report_path}")
 
-        self._save_html_report(timestamp)
-
-    def _save_html_report(self, timestamp: str) -> None:
-        stats = {
-            "Total Contacts": f"{len(self.df):,}",
-            "Unique Categories": len(self.df["category"].unique()),
-            "Contacts with Email": int(self.df["has_email"].sum()),
-            "Contacts with Notes": int(self.df["has_notes"].sum()),
-            "International Numbers": int(self.df["is_international"].sum()),
-            "High-Quality (Score ≥5)": int((self.df["contact_quality_score"] >= 5).sum()),
-            "Report Generated": datetime.now().strftime("%Y-%m-%d %H:%M"),
-        }
+        self._save_html_report(timestamp, stats, image=report_path.name)
 
+    def _save_html_report(
+        self, timestamp: str, stats: Dict[str, object], image: Optional[str]
+    ) -> None:
         rows = "".join(f"<tr><td><b>{k}</b></td><td>{v}</td></tr>" for k, v in stats.items())
+        img = f'<img src="{image}" style="width:100%;">' if image else ""
         html = f"""<!DOCTYPE html>
 <html lang="fa" dir="ltr">
 <head>
@@ -292,7 +366,7 @@ class ContactDataAnalyzer:
 <body>
     <h1>Professional Contact Manager Pro</h1>
     <h2>Data Analysis Report – {timestamp}</h2>
-    <img src="EDA_Report_{timestamp}.png" style="width:100%;">
+    {img}
     <h2>Summary Statistics</h2>
     <table>{rows}</table>
     <hr>
@@ -310,13 +384,6 @@ class ContactDataAnalyzer:
 
         timestamp = datetime.now().strftime("%Y%m%d_%H%M")
 
-        # Full dataset
-        self.df.to_csv(
-            self.output_dir / f"contacts_full_{timestamp}.csv",
-            index=False,
-            encoding="utf-8-sig",
-        )
-
         # ML-ready dataset
         ml_features = [
             "name_length",
@@ -340,19 +407,51 @@ class ContactDataAnalyzer:
             "category_encoded",
         ]
         ml_df = self.df[ml_features].copy()
-        ml_df.to_csv(self.output_dir / "contacts_ml_ready.csv", index=False)
-        ml_df.to_parquet(self.output_dir / "contacts_ml_ready.parquet", index=False)
 
-        # Category mapping
+        # The four outputs are independent; pyarrow releases the GIL while
+        # encoding and writing, so running them side by side overlaps the I/O
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            futures = [
+                # Full dataset (BOM kept so Excel detects UTF-8)
+                pool.submit(
+                    self._write_csv,
+                    self.df,
+                    self.output_dir / f"contacts_full_{timestamp}.csv",
+                    bom=True,
+                ),
+                pool.submit(self._write_csv, ml_df, self.output_dir / "contacts_ml_ready.csv"),
+                pool.submit(
+                    ml_df.to_parquet,
+                    self.output_dir / "contacts_ml_ready.parquet",
+                    index=False,
+                    engine="pyarrow",
+                    compression="zstd",
+                    use_dictionary=True,
+                    row_group_size=100_000,
+                ),
+                pool.submit(self._write_category_mapping),
+            ]
+            for future in futures:
+                future.result()
+
+        logger.info("All datasets exported.")
+
+    def _write_category_mapping(self) -> None:
         with open(self.output_dir / "category_mapping.json", "w", encoding="utf-8") as f:
             json.dump(self.category_mapping, f, ensure_ascii=False, indent=2)
 
-        logger.info("All datasets exported.")
+    @staticmethod
+    def _write_csv(df: pd.DataFrame, path: Path, bom: bool = False) -> None:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with open(path, "wb") as f:
+            if bom:
+                f.write(codecs.BOM_UTF8)
+            pacsv.write_csv(table, f, write_options=pacsv.WriteOptions(include_header=True))
 
     # ------------------------------------------------------------------
     # 5. Run pipeline
     # ------------------------------------------------------------------
-    def run(self) -> None:
+    def run(self, plots: bool = True) -> None:
         logger.info("=" * 70)
         logger.info("Starting Advanced Contact Data Analysis Pipeline")
         logger.info("=" * 70)
@@ -365,7 +464,7 @@ class ContactDataAnalyzer:
             return
 
         self.clean_and_engineer_features()
-        self.generate_eda_report()
+        self.generate_eda_report(plots=plots)
         self.export_datasets()
 
         logger.info("=" * 70)
@@ -378,5 +477,13 @@ class ContactDataAnalyzer:
 # Entry point
 # ----------------------------------------------------------------------
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Contact data analysis pipeline")
+    parser.add_argument(
+        "--no-plots",
+        action="store_true",
+        help="skip rendering the EDA figure (HTML summary and datasets only)",
+    )
+    args = parser.parse_args()
+
     analyzer = ContactDataAnalyzer()
-    analyzer.run()
+    analyzer.run(plots=not args.no_plots)